@@ -4,18 +4,76 @@ Handles all database operations and connections
 """
 
 import sqlite3
+import threading
+import time
+from contextlib import contextmanager
 from datetime import datetime, timedelta
 from typing import Dict, List, Optional, Tuple
 
 # Database configuration
 DATABASE = 'library.db'
 
+# Short-lived in-process catalog cache; any write to books bumps the version
+_catalog_lock = threading.Lock()
+_catalog_version = 0
+_catalog_cache = None  # (database, version, fetched_at, rows)
+
+# Bumped by every write to borrow_records, so callers can key caches on it
+_write_gen = 0
+
+# Per-connection settings: WAL lets readers run alongside a writer
+PRAGMAS = '''
+    PRAGMA journal_mode = WAL;
+    PRAGMA synchronous = NORMAL;
+    PRAGMA temp_store = MEMORY;
+    PRAGMA cache_size = -20000;
+'''
+
+# One reusable connection per thread, opened lazily by get_db_connection()
+_local = threading.local()
+
 def get_db_connection():
-    """Get a database connection."""
-    conn = sqlite3.connect(DATABASE)
-    conn.row_factory = sqlite3.Row  # This enables column access by name
+    """Get this thread's database connection (autocommit mode), opening it on first use."""
+    conn = getattr(_local, 'conn', None)
+    if conn is None or _local.database != DATABASE:
+        close_db_connection()
+        conn = sqlite3.connect(DATABASE, isolation_level=None, check_same_thread=False,
+                               cached_statements=256)
+        conn.row_factory = sqlite3.Row  # This enables column access by name
+        conn.executescript(PRAGMAS)
+        _local.conn = conn
+        _local.database = DATABASE
     return conn
 
+def close_db_connection():
+    """Close this thread's database connection, if one is open."""
+    conn = getattr(_local, 'conn', None)
+    if conn is not None:
+        conn.close()
+        _local.conn = None
+
+@contextmanager
+def transaction():
+    """Run a block atomically on this thread's connection; nested blocks use savepoints."""
+    conn = get_db_connection()
+    if conn.in_transaction:
+        conn.execute('SAVEPOINT nested')
+        try:
+            yield conn
+        except BaseException:
+            conn.execute('ROLLBACK TO nested')
+            conn.execute('RELEASE nested')
+            raise
+        conn.execute('RELEASE nested')
+    else:
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            yield conn
+        except BaseException:
+            conn.rollback()
+            raise
+        conn.commit()
+
 def init_database():
     """Initialize the database with required tables."""
     conn = get_db_connection()
@@ -45,8 +103,51 @@ def init_database():
         )
     ''')
     
-    conn.commit()
-    conn.close()
+    # Borrow lookups: per patron+book (active/latest loan) and active loans per patron
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_br_patron_book_return
+        ON borrow_records (patron_id, book_id, return_date, borrow_date DESC)
+    ''')
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_br_patron_active
+        ON borrow_records (patron_id) WHERE return_date IS NULL
+    ''')
+    
+    # Full-text index over title/author used by search (trigram => substring matching)
+    fts_exists = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'books_fts'"
+    ).fetchone()
+    conn.execute('''
+        CREATE VIRTUAL TABLE IF NOT EXISTS books_fts USING fts5(
+            title, author, content='books', content_rowid='id', tokenize='trigram'
+        )
+    ''')
+    if not fts_exists:
+        # Index any books that were added before the FTS table existed
+        conn.execute("INSERT INTO books_fts(books_fts) VALUES ('rebuild')")
+    
+    # Keep books_fts in sync with books
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS books_fts_ai AFTER INSERT ON books BEGIN
+            INSERT INTO books_fts (rowid, title, author) VALUES (new.id, new.title, new.author);
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS books_fts_ad AFTER DELETE ON books BEGIN
+            INSERT INTO books_fts (books_fts, rowid, title, author)
+            VALUES ('delete', old.id, old.title, old.author);
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS books_fts_au AFTER UPDATE OF title, author ON books BEGIN
+            INSERT INTO books_fts (books_fts, rowid, title, author)
+            VALUES ('delete', old.id, old.title, old.author);
+            INSERT INTO books_fts (rowid, title, author) VALUES (new.id, new.title, new.author);
+        END
+    ''')
+    
+    invalidate_catalog_cache()
+    bump_write_generation()
 
 def add_sample_data():
     """Add sample data to the database if it's empty."""
@@ -61,50 +162,149 @@ def add_sample_data():
             ('1984', 'George Orwell', '9780451524935', 1)
         ]
         
-        for title, author, isbn, copies in sample_books:
+        with transaction():
+            for title, author, isbn, copies in sample_books:
+                conn.execute('''
+                    INSERT INTO books (title, author, isbn, total_copies, available_copies)
+                    VALUES (?, ?, ?, ?, ?)
+                ''', (title, author, isbn, copies, copies))
+            
+            # Make 1984 unavailable by adding a borrow record
             conn.execute('''
-                INSERT INTO books (title, author, isbn, total_copies, available_copies)
-                VALUES (?, ?, ?, ?, ?)
-            ''', (title, author, isbn, copies, copies))
+                INSERT INTO borrow_records (patron_id, book_id, borrow_date, due_date)
+                VALUES (?, ?, ?, ?)
+            ''', ('123456', 3, 
+                  (datetime.now() - timedelta(days=5)).isoformat(),
+                  (datetime.now() + timedelta(days=9)).isoformat()))
+            
+            # Update available copies for 1984
+            conn.execute('UPDATE books SET available_copies = 0 WHERE id = 3')
         
-        # Make 1984 unavailable by adding a borrow record
-        conn.execute('''
-            INSERT INTO borrow_records (patron_id, book_id, borrow_date, due_date)
-            VALUES (?, ?, ?, ?)
-        ''', ('123456', 3, 
-              (datetime.now() - timedelta(days=5)).isoformat(),
-              (datetime.now() + timedelta(days=9)).isoformat()))
-        
-        # Update available copies for 1984
-        conn.execute('UPDATE books SET available_copies = 0 WHERE id = 3')
-        
-        conn.commit()
-    
-    conn.close()
+        invalidate_catalog_cache()
+        bump_write_generation()
 
 # Helper Functions for Database Operations
 
-def get_all_books() -> List[Dict]:
-    """Get all books from the database."""
+def get_all_books(limit: Optional[int] = None, offset: int = 0) -> List[Dict]:
+    """Get all books from the database, optionally one page of them (limit None = no limit)."""
     conn = get_db_connection()
-    books = conn.execute('SELECT * FROM books ORDER BY title').fetchall()
-    conn.close()
+    books = conn.execute(
+        'SELECT * FROM books ORDER BY title LIMIT ? OFFSET ?',
+        (-1 if limit is None else limit, offset),
+    ).fetchall()
     return [dict(book) for book in books]
 
+# Books in catalog-row shape (R2); 'actions' offers Borrow only when a copy is available
+CATALOG_SELECT = '''
+    SELECT b.id AS book_id, b.title, b.author, b.isbn, b.available_copies, b.total_copies,
+           CASE WHEN b.available_copies > 0 THEN 'Borrow' ELSE '' END AS actions
+    FROM books b
+'''
+
+def get_catalog_rows(limit: Optional[int] = None, offset: int = 0) -> List[sqlite3.Row]:
+    """Get catalog rows ordered by title, optionally one page of them (limit None = no limit)."""
+    conn = get_db_connection()
+    return conn.execute(
+        CATALOG_SELECT + 'ORDER BY b.title LIMIT ? OFFSET ?',
+        (-1 if limit is None else limit, offset),
+    ).fetchall()
+
+def invalidate_catalog_cache():
+    """Discard any cached catalog so the next read goes to the database."""
+    global _catalog_version
+    with _catalog_lock:
+        _catalog_version += 1
+
+def bump_write_generation():
+    """Mark borrow_records as changed; caches keyed on write_generation() go stale."""
+    global _write_gen
+    with _catalog_lock:
+        _write_gen += 1
+
+def write_generation() -> int:
+    """Return the current borrow_records write generation."""
+    return _write_gen
+
+def data_version() -> int:
+    """
+    PRAGMA data_version: changes when another connection commits to the database file.
+    A private :memory: database has no other writers, so it is always 0 there (no query).
+    For files the PRAGMA only reads a counter the pager already holds; it touches no pages.
+    """
+    if DATABASE == ':memory:':
+        return 0
+    return get_db_connection().execute('PRAGMA data_version').fetchone()[0]
+
+def get_catalog_rows_cached(max_age: float = 1.0) -> List[sqlite3.Row]:
+    """Get all catalog rows, reusing a result up to max_age seconds old if nothing was written since.
+
+    The returned list is shared between callers and must not be modified.
+    """
+    global _catalog_cache
+    now = time.monotonic()
+    with _catalog_lock:
+        cached = _catalog_cache
+        version = _catalog_version
+    if cached and cached[:2] == (DATABASE, version) and now - cached[2] <= max_age:
+        return cached[3]
+    
+    rows = get_catalog_rows()
+    with _catalog_lock:
+        # Only keep the result if no write happened while we were reading
+        if _catalog_version == version:
+            _catalog_cache = (DATABASE, version, now, rows)
+    return rows
+
 def get_book_by_id(book_id: int) -> Optional[Dict]:
     """Get a specific book by ID."""
     conn = get_db_connection()
     book = conn.execute('SELECT * FROM books WHERE id = ?', (book_id,)).fetchone()
-    conn.close()
     return dict(book) if book else None
 
 def get_book_by_isbn(isbn: str) -> Optional[Dict]:
     """Get a specific book by ISBN."""
     conn = get_db_connection()
     book = conn.execute('SELECT * FROM books WHERE isbn = ?', (isbn,)).fetchone()
-    conn.close()
     return dict(book) if book else None
 
+# Search statements by search type (fixed SQL text, only parameters vary)
+SEARCH_QUERIES = {
+    'isbn': CATALOG_SELECT + 'WHERE b.isbn = ? LIMIT ? OFFSET ?',
+    'title': CATALOG_SELECT + '''
+        JOIN books_fts f ON f.rowid = b.id
+        WHERE f.title MATCH ? ORDER BY b.title LIMIT ? OFFSET ?
+    ''',
+    'author': CATALOG_SELECT + '''
+        JOIN books_fts f ON f.rowid = b.id
+        WHERE f.author MATCH ? ORDER BY b.title LIMIT ? OFFSET ?
+    ''',
+}
+
+# Fallbacks for terms shorter than one trigram, which the FTS index cannot match.
+# LIKE folds case for ASCII letters only, so 1-2 character terms with non-ASCII
+# letters match case-sensitively (e.g. 'ça' does not find 'Ça'); longer terms
+# go through the trigram index, which folds Unicode case.
+SHORT_TERM_QUERIES = {
+    'title': CATALOG_SELECT + "WHERE b.title LIKE '%' || ? || '%' ESCAPE '\\' ORDER BY b.title LIMIT ? OFFSET ?",
+    'author': CATALOG_SELECT + "WHERE b.author LIKE '%' || ? || '%' ESCAPE '\\' ORDER BY b.title LIMIT ? OFFSET ?",
+}
+
+def search_books(search_type: str, term: str, limit: Optional[int] = None, offset: int = 0) -> List[Dict]:
+    """Search catalog rows by exact ISBN or partial, case-insensitive title/author, optionally paged."""
+    query = SEARCH_QUERIES.get(search_type)
+    if query is None:
+        return []
+    if search_type != 'isbn':
+        if len(term) >= 3:
+            # Quote as an FTS5 string so the term is matched literally as a substring
+            term = '"' + term.replace('"', '""') + '"'
+        else:
+            query = SHORT_TERM_QUERIES[search_type]
+            term = term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+    conn = get_db_connection()
+    books = conn.execute(query, (term, -1 if limit is None else limit, offset)).fetchall()
+    return [dict(book) for book in books]
+
 def get_patron_borrowed_books(patron_id: str) -> List[Dict]:
     """Get currently borrowed books for a patron."""
     conn = get_db_connection()
@@ -115,7 +315,6 @@ def get_patron_borrowed_books(patron_id: str) -> List[Dict]:
         WHERE br.patron_id = ? AND br.return_date IS NULL
         ORDER BY br.borrow_date
     ''', (patron_id,)).fetchall()
-    conn.close()
     
     borrowed_books = []
     for record in records:
@@ -137,23 +336,63 @@ def get_patron_borrow_count(patron_id: str) -> int:
         SELECT COUNT(*) as count FROM borrow_records 
         WHERE patron_id = ? AND return_date IS NULL
     ''', (patron_id,)).fetchone()['count']
-    conn.close()
     return count
 
-def insert_book(title: str, author: str, isbn: str, total_copies: int, available_copies: int) -> bool:
-    """Insert a new book into the database."""
+def get_borrow_context(book_id: int, patron_id: str, limit: int = 5) -> Optional[Dict]:
+    """Get a book's title and availability plus the patron's current borrow count, capped at limit."""
+    conn = get_db_connection()
+    # The inner LIMIT stops reading active loans once the borrowing limit is reached
+    row = conn.execute('''
+        SELECT b.id, b.title, b.available_copies,
+               (SELECT COUNT(*) FROM (
+                    SELECT 1 FROM borrow_records
+                    WHERE patron_id = ? AND return_date IS NULL
+                    LIMIT ?
+               )) AS borrowed
+        FROM books b
+        WHERE b.id = ?
+    ''', (patron_id, limit, book_id)).fetchone()
+    return dict(row) if row else None
+
+def get_return_context(patron_id: str, book_id: int) -> Optional[Dict]:
+    """Get a book's copy counts and the patron's active borrow of it (record_id is None if none)."""
+    conn = get_db_connection()
+    row = conn.execute('''
+        SELECT b.total_copies, b.available_copies,
+               br.id AS record_id, br.borrow_date, br.due_date
+        FROM books b
+        LEFT JOIN borrow_records br
+            ON br.book_id = b.id AND br.patron_id = ? AND br.return_date IS NULL
+        WHERE b.id = ?
+    ''', (patron_id, book_id)).fetchone()
+    return dict(row) if row else None
+
+def insert_book(title: str, author: str, isbn: str, total_copies: int, available_copies: int) -> Optional[int]:
+    """Insert a new book into the database and return its id (None on failure).
+
+    Raises sqlite3.IntegrityError if a book with the same ISBN already exists.
+    """
     conn = get_db_connection()
     try:
-        conn.execute('''
+        cursor = conn.execute('''
             INSERT INTO books (title, author, isbn, total_copies, available_copies)
             VALUES (?, ?, ?, ?, ?)
         ''', (title, author, isbn, total_copies, available_copies))
-        conn.commit()
-        conn.close()
-        return True
+        invalidate_catalog_cache()
+        return cursor.lastrowid
+    except sqlite3.IntegrityError:
+        raise
     except Exception as e:
-        conn.close()
-        return False
+        return None
+
+def bulk_insert_books(books: List[Tuple[str, str, str, int]]) -> None:
+    """Insert many (title, author, isbn, total_copies) books in one transaction, all copies available."""
+    with transaction() as conn:
+        conn.executemany('''
+            INSERT INTO books (title, author, isbn, total_copies, available_copies)
+            VALUES (?, ?, ?, ?, ?)
+        ''', [(title, author, isbn, copies, copies) for title, author, isbn, copies in books])
+    invalidate_catalog_cache()
 
 def insert_borrow_record(patron_id: str, book_id: int, borrow_date: datetime, due_date: datetime) -> bool:
     """Insert a new borrow record into the database."""
@@ -163,13 +402,25 @@ def insert_borrow_record(patron_id: str, book_id: int, borrow_date: datetime, du
             INSERT INTO borrow_records (patron_id, book_id, borrow_date, due_date)
             VALUES (?, ?, ?, ?)
         ''', (patron_id, book_id, borrow_date.isoformat(), due_date.isoformat()))
-        conn.commit()
-        conn.close()
+        bump_write_generation()
         return True
     except Exception as e:
-        conn.close()
         return False
 
+def insert_borrow_records(records: List[Tuple[str, int, datetime, datetime]]) -> bool:
+    """Insert many (patron_id, book_id, borrow_date, due_date) borrow records in one transaction."""
+    try:
+        with transaction() as conn:
+            conn.executemany('''
+                INSERT INTO borrow_records (patron_id, book_id, borrow_date, due_date)
+                VALUES (?, ?, ?, ?)
+            ''', [(patron_id, book_id, borrow_date.isoformat(), due_date.isoformat())
+                  for patron_id, book_id, borrow_date, due_date in records])
+    except sqlite3.Error:
+        return False
+    bump_write_generation()
+    return True
+
 def update_book_availability(book_id: int, change: int) -> bool:
     """Update the available copies of a book by a given amount (+1 for return, -1 for borrow)."""
     conn = get_db_connection()
@@ -177,13 +428,23 @@ def update_book_availability(book_id: int, change: int) -> bool:
         conn.execute('''
             UPDATE books SET available_copies = available_copies + ? WHERE id = ?
         ''', (change, book_id))
-        conn.commit()
-        conn.close()
+        invalidate_catalog_cache()
         return True
     except Exception as e:
-        conn.close()
         return False
 
+def update_book_availabilities(changes: List[Tuple[int, int]]) -> bool:
+    """Apply many (book_id, change) availability updates in one transaction."""
+    try:
+        with transaction() as conn:
+            conn.executemany('''
+                UPDATE books SET available_copies = available_copies + ? WHERE id = ?
+            ''', [(change, book_id) for book_id, change in changes])
+    except sqlite3.Error:
+        return False
+    invalidate_catalog_cache()
+    return True
+
 def update_borrow_record_return_date(patron_id: str, book_id: int, return_date: datetime) -> bool:
     """Update the return date for a borrow record."""
     conn = get_db_connection()
@@ -193,9 +454,50 @@ def update_borrow_record_return_date(patron_id: str, book_id: int, return_date:
             SET return_date = ? 
             WHERE patron_id = ? AND book_id = ? AND return_date IS NULL
         ''', (return_date.isoformat(), patron_id, book_id))
-        conn.commit()
-        conn.close()
+        bump_write_generation()
         return True
     except Exception as e:
-        conn.close()
         return False
+
+def record_borrow(patron_id: str, book_id: int, borrow_date: datetime, due_date: datetime) -> bool:
+    """Create a borrow record and take one copy in a single transaction."""
+    try:
+        with transaction() as conn:
+            conn.execute('''
+                INSERT INTO borrow_records (patron_id, book_id, borrow_date, due_date)
+                VALUES (?, ?, ?, ?)
+            ''', (patron_id, book_id, borrow_date.isoformat(), due_date.isoformat()))
+            taken = conn.execute('''
+                UPDATE books SET available_copies = available_copies - 1
+                WHERE id = ? AND available_copies > 0
+            ''', (book_id,)).rowcount
+            if not taken:
+                # No copy left to lend: undo the borrow record
+                raise sqlite3.IntegrityError('no available copies')
+    except sqlite3.Error:
+        return False
+    invalidate_catalog_cache()
+    bump_write_generation()
+    return True
+
+def record_return(patron_id: str, book_id: int, return_date: datetime) -> bool:
+    """Close the patron's active borrow of a book and restore one copy in a single transaction."""
+    try:
+        with transaction() as conn:
+            returned = conn.execute('''
+                UPDATE borrow_records 
+                SET return_date = ? 
+                WHERE patron_id = ? AND book_id = ? AND return_date IS NULL
+            ''', (return_date.isoformat(), patron_id, book_id)).rowcount
+            restocked = conn.execute('''
+                UPDATE books SET available_copies = available_copies + 1
+                WHERE id = ? AND available_copies < total_copies
+            ''', (book_id,)).rowcount
+            if not (returned and restocked):
+                # Nothing to return, or already at total copies: undo both updates
+                raise sqlite3.IntegrityError('return would leave inconsistent state')
+    except sqlite3.Error:
+        return False
+    invalidate_catalog_cache()
+    bump_write_generation()
+    return True
@@ -3,8 +3,7 @@ Catalog Routes - Book catalog related endpoints
 """
 
 from flask import Blueprint, render_template, request, redirect, url_for, flash
-from database import get_all_books
-from services.library_service import add_book_to_catalog
+from services.library_service import add_book_to_catalog, get_catalog_view
 
 catalog_bp = Blueprint('catalog', __name__)
 
@@ -19,7 +18,7 @@ def catalog():
     Display all books in the catalog.
     Implements R2: Book Catalog Display
     """
-    books = get_all_books()
+    books = get_catalog_view()
     return render_template('catalog.html', books=books)
 
 @catalog_bp.route('/add_book', methods=['GET', 'POST'])
@@ -43,7 +42,7 @@ def add_book():
         return render_template('add_book.html')
     
     # Use business logic function
-    success, message = add_book_to_catalog(title, author, isbn, total_copies)
+    success, message, _ = add_book_to_catalog(title, author, isbn, total_copies)
     
     if success:
         flash(message, 'success')
@@ -3,12 +3,76 @@ Library Service Module - Business Logic Functions
 Contains all the core business logic for the Library Management System
 """
 
-from datetime import datetime, timedelta
+import re
+import sqlite3
+from datetime import date, datetime, timedelta
 from typing import Dict, List, Optional, Tuple
 import database 
 from services.payment_service import PaymentGateway
 
-def add_book_to_catalog(title: str, author: str, isbn: str, total_copies: int) -> Tuple[bool, str]:
+#patron IDs are exactly 6 ASCII digits (library card number)
+_VALID_PID = re.compile(r"\A[0-9]{6}\Z").match
+
+#hot SQL kept as constants so every call sends identical text to the statement cache
+_SQL_LATEST_BORROW_DAYS_OVERDUE = """
+    SELECT MAX(0, CAST(julianday(date(COALESCE(return_date, ?)))
+                       - julianday(date(due_date)) AS INTEGER)) AS days_overdue
+    FROM borrow_records
+    WHERE patron_id=? AND book_id=?
+    ORDER BY borrow_date DESC
+    LIMIT 1
+"""
+
+_SQL_PATRON_BORROW_RECORDS = """
+    SELECT br.book_id, b.title,
+           substr(br.borrow_date, 1, 10) AS borrow_date,
+           substr(br.due_date, 1, 10) AS due_date,
+           substr(br.return_date, 1, 10) AS return_date
+    FROM borrow_records br
+    JOIN books b ON b.id = br.book_id
+    WHERE br.patron_id=?
+    ORDER BY br.borrow_date
+"""
+
+#patron reports keyed on (database, patron_id, write generation, data_version, day);
+#data_version catches commits from other connections/processes, and fees only change per day
+_REPORT_CACHE_MAX = 256
+_report_cache: Dict[tuple, Dict] = {}
+
+
+def _copy_report(report: Dict) -> Dict:
+    """Copy a cached report: it only holds flat row dicts in lists, so one level of copying is enough."""
+    return {
+        **report,
+        "current_loans": [dict(row) for row in report["current_loans"]],
+        "history": [dict(row) for row in report["history"]],
+    }
+
+
+def _validate_book_inputs(title: str, author: str, isbn: str, total_copies: int) -> Optional[str]:
+    """R1 input checks on already-stripped values; returns the error message, or None if valid."""
+    if not title:
+        return "Title is required."
+    
+    if len(title) > 200:
+        return "Title must be less than 200 characters."
+    
+    if not author:
+        return "Author is required."
+    
+    if len(author) > 100:
+        return "Author must be less than 100 characters."
+    
+    if len(isbn) != 13 or not (isbn.isascii() and isbn.isdigit()):
+        return "ISBN must be exactly 13 digits."
+    
+    if not isinstance(total_copies, int) or total_copies <= 0:
+        return "Total copies must be a positive integer."
+    
+    return None
+
+
+def add_book_to_catalog(title: str, author: str, isbn: str, total_copies: int) -> Tuple[bool, str, Optional[Dict]]:
     """
     Add a new book to the catalog.
     Implements R1: Book Catalog Management
@@ -20,58 +84,55 @@ def add_book_to_catalog(title: str, author: str, isbn: str, total_copies: int) -
         total_copies: Number of copies (positive integer)
         
     Returns:
-        tuple: (success: bool, message: str)
+        tuple: (success: bool, message: str, book: Optional[dict])
+        book is the inserted row (same keys as database.get_book_by_isbn), None on failure
     """
-    # Input validation
-    if not title or not title.strip():
-        return False, "Title is required."
-    
-    if len(title.strip()) > 200:
-        return False, "Title must be less than 200 characters."
-    
-    if not author or not author.strip():
-        return False, "Author is required."
+    # Strip once; validation and insert both use the stripped values
+    title = title.strip() if title else ""
+    author = author.strip() if author else ""
     
-    if len(author.strip()) > 100:
-        return False, "Author must be less than 100 characters."
+    error = _validate_book_inputs(title, author, isbn, total_copies)
+    if error:
+        return False, error, None
     
-    if len(isbn) != 13:
-        return False, "ISBN must be exactly 13 digits."
-    
-    if not isinstance(total_copies, int) or total_copies <= 0:
-        return False, "Total copies must be a positive integer."
-    
-    # Check for duplicate ISBN
-    existing = database.get_book_by_isbn(isbn)
-    if existing:
-        return False, "A book with this ISBN already exists."
-    
-    # Insert new book
-    success = database.insert_book(title.strip(), author.strip(), isbn, total_copies, total_copies)
-    if success:
-        return True, f'Book "{title.strip()}" has been successfully added to the catalog.'
+    # Insert new book; the UNIQUE(isbn) constraint rejects duplicates
+    try:
+        book_id = database.insert_book(title, author, isbn, total_copies, total_copies)
+    except sqlite3.IntegrityError:
+        return False, "A book with this ISBN already exists.", None
+    if book_id:
+        #build the row from what was just written instead of reading it back
+        book = {
+            "id": book_id,
+            "title": title,
+            "author": author,
+            "isbn": isbn,
+            "total_copies": total_copies,
+            "available_copies": total_copies,
+        }
+        return True, f'Book "{title}" has been successfully added to the catalog.', book
     else:
-        return False, "Database error occurred while adding the book."
+        return False, "Database error occurred while adding the book.", None
 
 
-def get_catalog_view() -> List[Dict]:
+def get_catalog_view(limit: Optional[int] = None, offset: int = 0) -> List[Dict]:
     """
     R2: Build the catalog rows from DB.
     Fields: book_id, title, author, isbn, available_copies, total_copies, actions
     'actions' includes 'Borrow' only if available_copies > 0.
+    Pass limit/offset to fetch a single page (ask for limit+1 to detect a next page).
     """
-    rows: List[Dict] = []
-    for b in database.get_all_books():
-        rows.append({
-            "book_id": b["id"],
-            "title": b["title"],
-            "author": b["author"],
-            "isbn": b["isbn"],
-            "available_copies": b["available_copies"],
-            "total_copies": b["total_copies"],
-            "actions": "Borrow" if b["available_copies"] > 0 else "",
-        })
-    return rows
+    #rows come back already in catalog shape; dict() copies them out of the shared cache
+    if limit is None and not offset:
+        rows = database.get_catalog_rows_cached()
+    else:
+        rows = database.get_catalog_rows(limit, offset)
+    return [dict(r) for r in rows]
+
+
+def get_catalog_view_indexed() -> Dict[str, Dict]:
+    """R2: The full catalog view keyed by ISBN, for direct lookup of a given book."""
+    return {row["isbn"]: row for row in get_catalog_view()}
 
 
 
@@ -88,37 +149,29 @@ def borrow_book_by_patron(patron_id: str, book_id: int) -> Tuple[bool, str]:
         tuple: (success: bool, message: str)
     """
     # Validate patron ID
-    if not patron_id or not patron_id.isdigit() or len(patron_id) != 6:
+    if not (patron_id and _VALID_PID(patron_id)):
         return False, "Invalid patron ID. Must be exactly 6 digits."
     
-    # Check if book exists and is available
-    book = database.get_book_by_id(book_id)
+    # Check if book exists and is available, and the patron's current borrowed books count
+    book = database.get_borrow_context(book_id, patron_id)
     if not book:
         return False, "Book not found."
     
     if book['available_copies'] <= 0:
         return False, "This book is currently not available."
     
-    # Check patron's current borrowed books count
-    current_borrowed = database.get_patron_borrow_count(patron_id)
-    
-    if current_borrowed >= 5:
+    if book['borrowed'] >= 5:
         return False, "You have reached the maximum borrowing limit of 5 books."
     
     # Create borrow record
     borrow_date = datetime.now()
     due_date = borrow_date + timedelta(days=14)
     
-    # Insert borrow record and update availability
-    borrow_success = database.insert_borrow_record(patron_id, book_id, borrow_date, due_date)
-    if not borrow_success:
+    # Insert borrow record and update availability in one transaction
+    if not database.record_borrow(patron_id, book_id, borrow_date, due_date):
         return False, "Database error occurred while creating borrow record."
     
-    availability_success = database.update_book_availability(book_id, -1)
-    if not availability_success:
-        return False, "Database error occurred while updating book availability."
-    
-    return True, f'Successfully borrowed "{book["title"]}". Due date: {due_date.strftime("%Y-%m-%d")}.'
+    return True, f'Successfully borrowed "{book["title"]}". Due date: {due_date.date().isoformat()}.'
 
 
 
@@ -128,39 +181,29 @@ def return_book_by_patron(patron_id: str, book_id: int) -> Tuple[bool, str]:
     increment availability, and include any late fee in the message.
     Enforces: patron_id 6 digits, available_copies cannot exceed total.
     """
-    pid = str(patron_id or "")
-    if not (pid.isdigit() and len(pid) == 6):
+    if not (patron_id and _VALID_PID(patron_id)):
         return False, "Invalid patron ID (must be 6 digits)."
 
-    book = database.get_book_by_id(int(book_id))
-    if not book:
+    #book copies and this patron's active borrow (if any) in one lookup
+    ctx = database.get_return_context(patron_id, int(book_id))
+    if ctx is None:
         return False, "Book not found."
 
     #verify an active borrow exists for this patron & book
-    conn = database.get_db_connection()
-    rec = conn.execute(
-        "SELECT id FROM borrow_records WHERE patron_id=? AND book_id=? AND return_date IS NULL",
-        (pid, int(book_id)),
-    ).fetchone()
-    conn.close()
-    if not rec:
+    if ctx["record_id"] is None:
         return False, "No active borrow record for this patron and book."
 
     #guards against exceeding total copies (spec constraint)
-    if book["available_copies"] >= book["total_copies"]:
+    if ctx["available_copies"] >= ctx["total_copies"]:
         return False, "Available copies cannot exceed total copies."
 
-    #record return date
-    if not database.update_borrow_record_return_date(pid, int(book_id), datetime.now()):
-        return False, "Could not update return date."
+    #record return date and increment availability (+1) in one transaction
+    returned_at = datetime.now()
+    if not database.record_return(patron_id, int(book_id), returned_at):
+        return False, "Could not record the return."
 
-    #increment availability (+1)
-    if not database.update_book_availability(int(book_id), +1):
-        return False, "Could not update book availability."
-
-    #late fee (R5 policy)
-    fee_info = calculate_late_fee_for_book(pid, int(book_id))
-    fee = float(fee_info.get("fee_amount", 0.0))
+    #late fee (R5 policy), from the borrow row we already have
+    fee, _ = _compute_fee(datetime.fromisoformat(ctx["due_date"]), returned_at)
 
     msg = "Book returned successfully."
     if fee > 0:
@@ -168,71 +211,65 @@ def return_book_by_patron(patron_id: str, book_id: int) -> Tuple[bool, str]:
     return True, msg
 
 
-def calculate_late_fee_for_book(patron_id: str, book_id: int) -> Dict:
+#R5 fee by days overdue: $0.50/day for 7 days, then $1.00/day, capped at $15.00.
+#The cap is reached at 19 days, so the last entry covers anything longer.
+_FEE_TABLE = tuple(
+    round(min(15.00, 0.50 * min(d, 7) + 1.00 * max(d - 7, 0)), 2) for d in range(20)
+)
+
+
+def _fee_for_days(days_overdue: int) -> float:
+    """R5 fee for a number of overdue days, rounded to 2dp."""
+    return _FEE_TABLE[min(days_overdue, len(_FEE_TABLE) - 1)]
+
+
+def _compute_fee(due: datetime, stop: datetime) -> Tuple[float, int]:
+    """
+    R5 fee for a loan due at `due` and returned (or checked) at `stop`.
+    Returns (fee_amount rounded to 2dp, days_overdue).
+    """
+    #calendar-day difference via ordinals (ints), no intermediate date/timedelta objects
+    days_overdue = max(0, stop.toordinal() - due.toordinal())
+    return _fee_for_days(days_overdue), days_overdue
+
+
+def calculate_late_fee_for_book(patron_id: str, book_id: int, *, now: Optional[datetime] = None) -> Dict:
     """
     R5: Late fee where due = borrow_date + 14 days.
     $0.50/day for first 7 overdue days, then $1.00/day; cap $15.00.
+    `now` is the check time for unreturned books (defaults to the current time).
     Returns {'fee_amount': float(2dp), 'days_overdue': int}.
     """
+    if now is None:
+        now = datetime.now()
+    #day-precision overdue count computed by SQLite;
+    #if returned, compute based on return_date, otherwise use now
     conn = database.get_db_connection()
     r = conn.execute(
-        """
-        SELECT borrow_date, due_date, return_date
-        FROM borrow_records
-        WHERE patron_id=? AND book_id=?
-        ORDER BY borrow_date DESC
-        LIMIT 1
-        """,
-        (str(patron_id), int(book_id)),
+        _SQL_LATEST_BORROW_DAYS_OVERDUE,
+        (now.isoformat(), str(patron_id), int(book_id)),
     ).fetchone()
-    conn.close()
 
     if not r:
         return {"fee_amount": 0.00, "days_overdue": 0}
 
-    due = datetime.fromisoformat(r["due_date"])
-    #if returned, compute based on return_date, otherwise use now
-    stop = datetime.fromisoformat(r["return_date"]) if r["return_date"] else datetime.now()
+    days_overdue = r["days_overdue"]
+    return {"fee_amount": _fee_for_days(days_overdue), "days_overdue": days_overdue}
 
-    days_overdue = max(0, (stop.date() - due.date()).days)
-    fee = 0.50 * min(days_overdue, 7) + 1.00 * max(days_overdue - 7, 0)
-    fee = min(15.00, fee)
 
-    return {"fee_amount": round(fee, 2), "days_overdue": int(days_overdue)}
-
-
-def search_books_in_catalog(search_term: str, search_type: str) -> List[Dict]:
+def search_books_in_catalog(search_term: str, search_type: str,
+                            limit: Optional[int] = None, offset: int = 0) -> List[Dict]:
     """
     R6: Search with parameters q=search_term and type in {title, author, isbn}.
     - title/author: partial, case-insensitive
     - isbn: exact match
-    Returns rows in the same shape as catalog rows (R2).
+    Returns rows in the same shape as catalog rows (R2), optionally one page of them.
     """
     term = (search_term or "").strip()
     stype = (search_type or "").strip().lower()
 
-    books = database.get_all_books()
-    if stype == "isbn":
-        books = [b for b in books if b["isbn"] == term]
-    elif stype == "title":
-        books = [b for b in books if term.lower() in b["title"].lower()]
-    elif stype == "author":
-        books = [b for b in books if term.lower() in b["author"].lower()]
-    else:
-        return []
-
-    rows: List[Dict] = []
-    for b in books:
-        rows.append({
-            "book_id": b["id"],
-            "title": b["title"],
-            "author": b["author"],
-            "isbn": b["isbn"],
-            "available_copies": b["available_copies"],
-            "total_copies": b["total_copies"],
-            "actions": "Borrow" if b["available_copies"] > 0 else "",
-        })
-    return rows
+    #filtering and row shaping happen in SQL; unknown search types yield no rows
+    return database.search_books(stype, term, limit, offset)
 
 
 def get_patron_status_report(patron_id: str) -> Dict:
@@ -243,50 +280,51 @@ def get_patron_status_report(patron_id: str) -> Dict:
       - number of books currently borrowed
       - borrowing history (all records)
     Monetary values are 2 decimals as per constraints.
+    Reports are cached until the next borrow/return write (from any connection)
+    or day change; callers get their own copy.
     """
     pid = str(patron_id)
+    key = (database.DATABASE, pid, database.write_generation(), database.data_version(), date.today())
+    cached = _report_cache.get(key)
+    if cached is not None:
+        return _copy_report(cached)
 
-    #current loans (database.get_patron_borrowed_books returns datetimes)
-    current = database.get_patron_borrowed_books(pid)
-    current_rows = [{
-        "book_id": b["book_id"],
-        "title": b["title"],
-        "due_date": b["due_date"].strftime("%Y-%m-%d"),
-    } for b in current]
-
-    #total late fees across current loans only
-    total_fee = 0.0
-    for b in current:
-        info = calculate_late_fee_for_book(pid, b["book_id"])
-        total_fee += float(info["fee_amount"])
-
-    #full borrowing history (returned + current)
+    #all borrow records (returned + current) in one round-trip
     conn = database.get_db_connection()
-    rows = conn.execute(
-        """
-        SELECT br.book_id, b.title, br.borrow_date, br.return_date
-        FROM borrow_records br
-        JOIN books b ON b.id = br.book_id
-        WHERE br.patron_id=?
-        ORDER BY br.borrow_date
-        """,
-        (pid,),
-    ).fetchall()
-    conn.close()
-
-    history = [{
-        "book_id": r["book_id"],
-        "title": r["title"],
-        "borrow_date": r["borrow_date"][:10],
-        "return_date": r["return_date"][:10] if r["return_date"] else None,
-    } for r in rows]
+    rows = conn.execute(_SQL_PATRON_BORROW_RECORDS, (pid,)).fetchall()
 
-    return {
+    #single pass: history gets every record, current loans only the unreturned ones
+    now = datetime.now()
+    current_rows: List[Dict] = []
+    history: List[Dict] = []
+    total_fee = 0.0
+    for r in rows:
+        history.append({
+            "book_id": r["book_id"],
+            "title": r["title"],
+            "borrow_date": r["borrow_date"],
+            "return_date": r["return_date"],
+        })
+        if r["return_date"] is None:
+            current_rows.append({
+                "book_id": r["book_id"],
+                "title": r["title"],
+                "due_date": r["due_date"],
+            })
+            #late fee for this loan (R5 policy)
+            fee, _ = _compute_fee(datetime.fromisoformat(r["due_date"]), now)
+            total_fee += fee
+
+    report = {
         "current_loans": current_rows,
         "total_late_fees": round(total_fee, 2),
         "borrowed_count": len(current_rows),
         "history": history,
     }
+    if len(_report_cache) >= _REPORT_CACHE_MAX:
+        _report_cache.clear()
+    _report_cache[key] = report
+    return _copy_report(report)
 
 def pay_late_fees(patron_id: str, book_id: int, payment_gateway: PaymentGateway = None) -> Tuple[bool, str, Optional[str]]:
     """
@@ -310,7 +348,7 @@ def pay_late_fees(patron_id: str, book_id: int, payment_gateway: PaymentGateway
         success, msg, txn = pay_late_fees("123456", 1, mock_gateway)
     """
     # Validate patron ID
-    if not patron_id or not patron_id.isdigit() or len(patron_id) != 6:
+    if not (patron_id and _VALID_PID(patron_id)):
         return False, "Invalid patron ID. Must be exactly 6 digits.", None
     
     # Calculate late fee first
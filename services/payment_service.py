@@ -9,6 +9,7 @@ since we cannot make actual payment API calls during testing.
 import requests
 from typing import Dict, Tuple
 import time
+import uuid
 
 
 class PaymentGateway:
@@ -31,6 +32,8 @@ class PaymentGateway:
         """
         self.api_key = api_key
         self.base_url = "https://api.payment-gateway.example.com"
+        # Transactions processed by this gateway, keyed by transaction ID
+        self._txns: Dict[str, Dict] = {}
     
     def process_payment(self, patron_id: str, amount: float, description: str = "") -> Tuple[bool, str, str]:
         """
@@ -79,7 +82,15 @@ class PaymentGateway:
             return False, "", "Invalid patron ID format"
         
         # Simulate successful payment
-        transaction_id = f"txn_{patron_id}_{int(time.time())}"
+        # Random suffix keeps IDs unique for payments in the same second
+        transaction_id = f"txn_{patron_id}_{int(time.time())}_{uuid.uuid4().hex[:8]}"
+        self._txns[transaction_id] = {
+            "transaction_id": transaction_id,
+            "status": "completed",
+            "amount": amount,
+            "description": description,
+            "timestamp": time.time()
+        }
         return True, transaction_id, f"Payment of ${amount:.2f} processed successfully"
     
     def refund_payment(self, transaction_id: str, amount: float) -> Tuple[bool, str]:
@@ -122,13 +133,9 @@ class PaymentGateway:
         """
         time.sleep(0.3)
         
-        if not transaction_id or not transaction_id.startswith("txn_"):
+        # Only transactions processed by this gateway are known
+        record = self._txns.get(transaction_id) if transaction_id else None
+        if record is None:
             return {"status": "not_found", "message": "Transaction not found"}
         
-        # Simulate status check
-        return {
-            "transaction_id": transaction_id,
-            "status": "completed",
-            "amount": 10.50,
-            "timestamp": time.time()
-        }
+        return dict(record)
@@ -1,15 +1,145 @@
+import threading
+import uuid
+
 import pytest
-import os
+from freezegun import freeze_time
+import database
 from database import init_database
 
-@pytest.fixture(autouse=True)
-def setup_test_database():
-    import database
+@pytest.fixture(scope="session")
+def test_db_connection():
+    """One in-memory database with the schema built once for the whole run."""
     original_database = database.DATABASE
-    test_database = "test_library.db"
-    database.DATABASE = test_database
+    database.DATABASE = ":memory:"
+    conn = database.get_db_connection()
+    conn.executescript("PRAGMA synchronous = OFF; PRAGMA journal_mode = MEMORY;")
     init_database()
-    yield
+    yield conn
+    database.close_db_connection()
     database.DATABASE = original_database
-    if os.path.exists(test_database):
-        os.remove(test_database)
\ No newline at end of file
+
+#every test runs at the same instant, so date arithmetic is deterministic
+FROZEN_NOW = "2025-01-15 10:00:00"
+
+@pytest.fixture(autouse=True)
+def frozen_time():
+    """Freeze datetime.now() (and friends) at FROZEN_NOW for the test."""
+    with freeze_time(FROZEN_NOW) as frozen:
+        yield frozen
+
+@pytest.fixture(autouse=True)
+def setup_test_database(test_db_connection):
+    """Run each test inside a savepoint and roll it back afterwards."""
+    conn = test_db_connection
+    conn.execute("SAVEPOINT test_case")
+    yield
+    conn.execute("ROLLBACK TO test_case")
+    conn.execute("RELEASE test_case")
+    #rolled-back rows must not be served from the in-process caches
+    database.invalidate_catalog_cache()
+    database.bump_write_generation()
+
+
+@pytest.fixture
+def run_on_file_database(tmp_path):
+    """
+    Return a runner that calls fn(path) against a fresh on-disk database.
+    fn runs on its own thread, so it gets a separate top-level connection
+    (outside the per-test savepoint) while this thread's :memory: one is untouched.
+    """
+    def run(fn):
+        path = str(tmp_path / "library.db")
+        outcome = {}
+
+        def target():
+            try:
+                init_database()
+                outcome["result"] = fn(path)
+            except BaseException as exc:
+                outcome["error"] = exc
+            finally:
+                database.close_db_connection()
+
+        original_database = database.DATABASE
+        database.DATABASE = path
+        try:
+            worker = threading.Thread(target=target)
+            worker.start()
+            worker.join()
+        finally:
+            database.DATABASE = original_database
+            database.invalidate_catalog_cache()
+            database.bump_write_generation()
+        if "error" in outcome:
+            raise outcome["error"]
+        return outcome.get("result")
+
+    return run
+
+
+#catalog shared by the search (f5) and patron status (r7) tests
+SEED_BOOKS = [
+    ("Harry Potter and the Philosopher's Stone", "J.K. Rowling", "7777777777777", 2),
+    ("Chamber of Secrets", "J.K. Rowling", "9999999999999", 1),
+    ("Clean Code", "Robert C. Martin", "9780132350884", 2),
+    ("Clean Architecture", "Robert C. Martin", "3030303030303", 1),
+    ("Effective Python", "Brett Slatkin", "9780134034287", 1),
+    ("Exact Match Book", "Author A", "1010101010101", 1),
+    ("Different Book", "Author B", "2020202020202", 1),
+    ("Overdue Five", "Tester", "9012345678901", 1),
+    ("Overdue Ten", "Tester", "9012345678902", 1),
+    ("History Book", "Tester", "9012345678903", 1),
+]
+
+@pytest.fixture
+def seeded_books():
+    """Insert SEED_BOOKS in one batch and return the stored rows keyed by ISBN."""
+    database.bulk_insert_books(SEED_BOOKS)
+    return {book["isbn"]: book for book in database.get_all_books()}
+
+@pytest.fixture
+def isbn():
+    """A fresh 13-digit ISBN, so tests never collide on the UNIQUE isbn column."""
+    return str(uuid.uuid4().int)[:13]
+
+
+#hand-rolled stand-in for PaymentGateway used by the payment tests;
+#cheaper than Mock(spec=PaymentGateway): plain attributes, no spec proxying
+class StubMethod:
+    """One stubbed gateway method: records calls and returns/raises what it is told to."""
+
+    def __init__(self, return_value=None, side_effect=None):
+        self.return_value = return_value
+        self.side_effect = side_effect
+        self.calls = []  # [(args, kwargs), ...]
+
+    def __call__(self, *args, **kwargs):
+        self.calls.append((args, kwargs))
+        if self.side_effect is not None:
+            raise self.side_effect
+        return self.return_value
+
+    def assert_not_called(self):
+        assert not self.calls, f"expected no calls, got {self.calls}"
+
+    def assert_called_once(self):
+        assert len(self.calls) == 1, f"expected 1 call, got {len(self.calls)}"
+
+    def assert_called_once_with(self, *args, **kwargs):
+        self.assert_called_once()
+        assert self.calls[0] == (args, kwargs), f"expected {(args, kwargs)}, got {self.calls[0]}"
+
+
+class StubGateway:
+    """Drop-in for PaymentGateway whose methods are StubMethod instances."""
+
+    def __init__(self):
+        self.process_payment = StubMethod()
+        self.refund_payment = StubMethod()
+        self.verify_payment_status = StubMethod()
+
+
+@pytest.fixture
+def stub_gateway():
+    """A fresh StubGateway for each test."""
+    return StubGateway()
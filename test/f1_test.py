@@ -1,18 +1,19 @@
 import pytest
+import database
 from services.library_service import (
     add_book_to_catalog
 )
 
 def test_add_book_valid_input():
     """Test adding a book with valid input."""
-    success, message = add_book_to_catalog("Test Book", "Test Author", "1234567890123", 5)
+    success, message, _ = add_book_to_catalog("Test Book", "Test Author", "1234567890123", 5)
     
     assert success == True
     assert "successfully added" in message.lower()
 
 def test_add_book_invalid_isbn_too_short():
     """Test adding a book with ISBN too short."""
-    success, message = add_book_to_catalog("Test Book", "Test Author", "123456789", 5)
+    success, message, _ = add_book_to_catalog("Test Book", "Test Author", "123456789", 5)
     
     assert success == False
     assert "13 digits" in message
@@ -21,7 +22,7 @@ def test_add_book_invalid_isbn_too_short():
 
 def test_add_book_missing_title():
     """Test adding a book with no title."""
-    success, message = add_book_to_catalog("", "Any Author", "1234567890123", 3)
+    success, message, _ = add_book_to_catalog("", "Any Author", "1234567890123", 3)
 
     assert success is False
     assert "title is required" in message.lower()
@@ -29,7 +30,7 @@ def test_add_book_missing_title():
 
 def test_add_book_author_missing():
     """Test adding a book with no author."""
-    success, message = add_book_to_catalog("Some Title", "", "1234567890123", 2)
+    success, message, _ = add_book_to_catalog("Some Title", "", "1234567890123", 2)
 
     assert success is False
     assert "author is required" in message.lower()
@@ -38,7 +39,7 @@ def test_add_book_author_missing():
 def test_add_book_title_too_long():
     """Test adding a book with a title longer than 200 characters."""
     long_title = "S" * 201
-    success, message = add_book_to_catalog(long_title, "Author", "1234567890123", 4)
+    success, message, _ = add_book_to_catalog(long_title, "Author", "1234567890123", 4)
 
     assert success is False
     assert "less than 200" in message.lower()
@@ -46,8 +47,36 @@ def test_add_book_title_too_long():
 
 def test_add_book_invalid_total_copies():
     """Test adding a book with zero copies."""
-    success, message = add_book_to_catalog("Book Title", "Author", "1234567890123", 0)
+    success, message, _ = add_book_to_catalog("Book Title", "Author", "1234567890123", 0)
 
     assert success is False
     assert "positive integer" in message.lower()
 
+
+
+def test_add_book_isbn_not_digits():
+    """Test adding a book with a 13-character ISBN that is not all digits."""
+    success, message, _ = add_book_to_catalog("Book Title", "Author", "123456789012X", 1)
+
+    assert success is False
+    assert "13 digits" in message
+
+
+def test_add_book_duplicate_isbn():
+    """Test adding a second book with an ISBN already in the catalog."""
+    success, _, _ = add_book_to_catalog("First", "Author", "1234567890123", 1)
+    assert success is True
+
+    success, message, _ = add_book_to_catalog("Second", "Author", "1234567890123", 1)
+
+    assert success is False
+    assert "already exists" in message.lower()
+
+
+def test_add_book_returns_inserted_row():
+    """Test the returned book matches the row stored in the database."""
+    success, _, book = add_book_to_catalog("  Padded Title ", "Author", "1234567890123", 2)
+
+    assert success is True
+    assert book == database.get_book_by_isbn("1234567890123")
+    assert book["title"] == "Padded Title"
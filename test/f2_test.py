@@ -1,9 +1,13 @@
 import pytest
+import sqlite3
+from datetime import datetime, timedelta
+
+import database
 from services.library_service import (
     borrow_book_by_patron
 )
 
-# five unit tests for the borrow_book_by_patron function
+# unit tests for the borrow_book_by_patron function and its borrow transaction
 
 def test_borrow_invalid_patron_id_too_short():
     """Reject patron IDs that aren't exactly 6 digits (too short)."""
@@ -33,4 +37,31 @@ def test_borrow_book_id_wrong_type():
     """Noninteger book_id should be treated as not found."""
     success, message = borrow_book_by_patron("123456", "notaint")  
     assert success is False
-    assert "book not found" in message.lower()
\ No newline at end of file
+    assert "book not found" in message.lower()
+
+def test_borrow_transaction_commits_and_rolls_back_at_top_level(run_on_file_database):
+    """Outside the test savepoint, record_borrow commits and a failing transaction() rolls back."""
+    def scenario(path):
+        database.bulk_insert_books([("Top Level Book", "Tester", "6666666666666", 1)])
+        book = database.get_book_by_isbn("6666666666666")
+        assert not database.get_db_connection().in_transaction  # BEGIN IMMEDIATE path, not a savepoint
+
+        now = datetime.now()
+        assert database.record_borrow("123456", book["id"], now, now + timedelta(days=14)) is True
+
+        with pytest.raises(ValueError):
+            with database.transaction() as conn:
+                conn.execute("UPDATE books SET available_copies = 5 WHERE id = ?", (book["id"],))
+                raise ValueError("abort")
+
+        #no copies left: record_borrow rolls its own insert back
+        assert database.record_borrow("654321", book["id"], now, now + timedelta(days=14)) is False
+
+        #read back through an independent connection to see only committed state
+        other = sqlite3.connect(path)
+        available = other.execute("SELECT available_copies FROM books WHERE id = ?", (book["id"],)).fetchone()[0]
+        patrons = [r[0] for r in other.execute("SELECT patron_id FROM borrow_records")]
+        other.close()
+        return available, patrons
+
+    assert run_on_file_database(scenario) == (0, ["123456"])
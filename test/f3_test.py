@@ -12,10 +12,8 @@ from services.library_service import (
 def test_return_invalid_patron_id():
     """Return should reject a patron ID that isn't exactly 6 digits."""
     # Arrange: create a real book so book_id is valid
-    ok, _ = add_book_to_catalog("Any Book", "Anon", "1010101010101", 1)
+    ok, _, book = add_book_to_catalog("Any Book", "Anon", "1010101010101", 1)
     assert ok is True
-    book = database.get_book_by_isbn("1010101010101")
-    assert book is not None
 
     # Act
     success, message = return_book_by_patron("12a45", book["id"])
@@ -38,10 +36,8 @@ def test_return_book_not_found():
 def test_return_no_active_loan():
     """Return should fail when the patron has no active loan for this book."""
     # Arrange: create a real book but DO NOT borrow it
-    ok, _ = add_book_to_catalog("Unborrowed", "Anon", "2020202020202", 1)
+    ok, _, book = add_book_to_catalog("Unborrowed", "Anon", "2020202020202", 1)
     assert ok is True
-    book = database.get_book_by_isbn("2020202020202")
-    assert book is not None
 
     # Act
     success, message = return_book_by_patron("123456", book["id"])
@@ -55,10 +51,8 @@ def test_return_no_active_loan():
 def test_return_success():
     """Returning a borrowed book should succeed and mention 'returned' or 'success'."""
     # Arrange: create a book and seed an ACTIVE borrow
-    ok, _ = add_book_to_catalog("Borrowed", "Anon", "3030303030303", 1)
+    ok, _, book = add_book_to_catalog("Borrowed", "Anon", "3030303030303", 1)
     assert ok is True
-    book = database.get_book_by_isbn("3030303030303")
-    assert book is not None
 
     borrow_date = datetime.now()
     due_date = borrow_date + timedelta(days=14)
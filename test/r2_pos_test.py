@@ -1,19 +1,20 @@
 import pytest
-from services.library_service import add_book_to_catalog, get_catalog_view
+from services.library_service import add_book_to_catalog, get_catalog_view, get_catalog_view_indexed
 
 #after feedback from A1, this file has been added
 
 def test_catalog_displays_added_book_with_borrow_action():
     """R2 positive: catalog shows required fields and 'Borrow' for available book."""
     #follow arrange, act, asssert structure
-    success, msg = add_book_to_catalog("Test Book", "Test Author", "1234567890123", 3)
+    success, msg, _ = add_book_to_catalog("Test Book", "Test Author", "1234567890123", 3)
     assert success is True
     assert "added" in msg.lower()
 
-    rows = get_catalog_view()
+    rows_by_isbn = get_catalog_view_indexed()
 
-    assert isinstance(rows, list) and len(rows) >= 1
-    row = next(r for r in rows if r["title"] == "Test Book")
+    assert "1234567890123" in rows_by_isbn
+    row = rows_by_isbn["1234567890123"]
+    assert row["title"] == "Test Book"
 
     for key in ("book_id", "title", "author", "isbn", "available_copies", "total_copies", "actions"):
         assert key in row
@@ -26,3 +27,16 @@ def test_catalog_displays_added_book_with_borrow_action():
     #borrow should be available when copies > 0
     assert isinstance(row["actions"], str)
     assert "borrow" in row["actions"].lower()
+
+
+def test_catalog_view_pages_with_limit_and_offset():
+    """R2 paging: limit/offset return consecutive slices of the title-ordered catalog."""
+    for i, title in enumerate(("Alpha", "Bravo", "Charlie")):
+        success, _, _ = add_book_to_catalog(title, "Author", f"111111111111{i}", 1)
+        assert success is True
+
+    first = get_catalog_view(limit=2)
+    rest = get_catalog_view(limit=2, offset=2)
+
+    assert [r["title"] for r in first] == ["Alpha", "Bravo"]
+    assert [r["title"] for r in rest] == ["Charlie"]
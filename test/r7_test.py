@@ -1,26 +1,20 @@
 import pytest
+import sqlite3
 from datetime import datetime, timedelta
 
 import database
-from services.library_service import add_book_to_catalog, get_catalog_view, get_patron_status_report
+from services.library_service import get_patron_status_report
 
 #after feedback from A1, this file has been added
 #this section could also be referred to as f7_test
 
-def test_patron_status_report_current_loans_fees_count_and_history():
+def test_patron_status_report_current_loans_fees_count_and_history(seeded_books):
     """R7 positive: report includes current loans (with due dates), total fees, count, and history."""
     patron = "123456"
 
-    #arrange: add two books
-    ok, _ = add_book_to_catalog("Clean Code", "Robert C. Martin", "9780132350884", 2)
-    assert ok is True
-    ok, _ = add_book_to_catalog("Effective Python", "Brett Slatkin", "9780134034287", 1)
-    assert ok is True
-
-    #look up book ids
-    b1 = database.get_book_by_isbn("9780132350884")  # will be current overdue
-    b2 = database.get_book_by_isbn("9780134034287")  # will be borrowed+returned (history)
-    assert b1 and b2
+    #arrange: two seeded books
+    b1 = seeded_books["9780132350884"]  # will be current overdue
+    b2 = seeded_books["9780134034287"]  # will be borrowed+returned (history)
 
     #seed ONE overdue current loan:
     borrow_date_overdue = datetime.now() - timedelta(days=20)   # borrowed 20 days ago
@@ -56,13 +50,13 @@ def test_patron_status_report_current_loans_fees_count_and_history():
     assert str(curr["due_date"])[:4].isdigit()
 
     #total late fees should include the 6 overdue days at $0.50 = $3.00 (within rounding)
-    fee = float(report["total_late_fees"]) if not isinstance(report["total_late_fees"], (int, float)) else report["total_late_fees"]
-    assert round(fee, 2) == 3.00
+    assert isinstance(report["total_late_fees"], float)
+    assert report["total_late_fees"] == 3.00
 
     #the history should at least include the returned b2 record
     assert isinstance(report["history"], list) and len(report["history"]) >= 1
-    hist_ids = [h.get("book_id") for h in report["history"]]
-    assert b2["id"] in hist_ids
+    hist_by_id = {h["book_id"]: h for h in report["history"]}
+    assert b2["id"] in hist_by_id
 
 
 
@@ -73,54 +67,49 @@ def test_patron_status_no_loans_returns_empty_zero():
     report = get_patron_status_report(patron)
     
     assert report["borrowed_count"] == 0
-    assert float(report["total_late_fees"]) == 0.00
+    assert report["total_late_fees"] == 0.00
     assert isinstance(report["current_loans"], list) and len(report["current_loans"]) == 0
     assert isinstance(report["history"], list) and len(report["history"]) == 0
 
 
-def test_patron_status_multiple_current_loans_fee_sum_and_count():
+def test_patron_status_multiple_current_loans_fee_sum_and_count(seeded_books):
     """R7 positive: two current overdue loans; fees should sum and count should be 2."""
     patron = "123457"
 
 
-    ok, _ = add_book_to_catalog("Overdue Five", "Tester", "9012345678901", 1)
-    assert ok is True
-    ok, _ = add_book_to_catalog("Overdue Ten", "Tester", "9012345678902", 1)
-    assert ok is True
-    b1 = database.get_book_by_isbn("9012345678901")
-    b2 = database.get_book_by_isbn("9012345678902")
-    assert b1 and b2
+    b1 = seeded_books["9012345678901"]
+    b2 = seeded_books["9012345678902"]
 
     #5 days overdue today -> $2.50
     borrow_1 = datetime.now() - timedelta(days=19)   # 14 + 5
     due_1 = borrow_1 + timedelta(days=14)
-    assert database.insert_borrow_record(patron, b1["id"], borrow_1, due_1)
-    assert database.update_book_availability(b1["id"], -1)
 
     #10 days overdue today -> $6.50
     borrow_2 = datetime.now() - timedelta(days=24)   # 14 + 10
     due_2 = borrow_2 + timedelta(days=14)
-    assert database.insert_borrow_record(patron, b2["id"], borrow_2, due_2)
-    assert database.update_book_availability(b2["id"], -1)
+
+    assert database.insert_borrow_records([
+        (patron, b1["id"], borrow_1, due_1),
+        (patron, b2["id"], borrow_2, due_2),
+    ])
+    assert database.update_book_availabilities([(b1["id"], -1), (b2["id"], -1)])
 
     report = get_patron_status_report(patron)
 
     assert report["borrowed_count"] == 2
     assert len(report["current_loans"]) == 2
-    ids = {row["book_id"] for row in report["current_loans"]}
-    assert b1["id"] in ids and b2["id"] in ids
-    assert round(float(report["total_late_fees"]), 2) == 9.00  # 2.50 + 6.50
+    by_id = {row["book_id"]: row for row in report["current_loans"]}
+    assert b1["id"] in by_id and b2["id"] in by_id
+    assert by_id[b1["id"]]["title"] == "Overdue Five"
+    assert report["total_late_fees"] == 9.00  # 2.50 + 6.50
 
 
-def test_patron_status_history_dates_are_strings():
+def test_patron_status_history_dates_are_strings(seeded_books):
     """R7 format: history returns date strings 'YYYY-MM-DD' for borrow/return."""
     patron = "123458"
 
-    #add one book, borrow and return next day (on time)
-    ok, _ = add_book_to_catalog("History Book", "Tester", "9012345678903", 1)
-    assert ok is True
-    b = database.get_book_by_isbn("9012345678903")
-    assert b
+    #one seeded book, borrowed and returned next day (on time)
+    b = seeded_books["9012345678903"]
 
     borrow_date = datetime.now() - timedelta(days=5)
     due_date = borrow_date + timedelta(days=14)
@@ -132,10 +121,48 @@ def test_patron_status_history_dates_are_strings():
     report = get_patron_status_report(patron)
 
     assert report["borrowed_count"] == 0
-    assert float(report["total_late_fees"]) == 0.00
+    assert report["total_late_fees"] == 0.00
     assert len(report["history"]) == 1
     h = report["history"][0]
     # dates are strings like 'YYYY-MM-DD'
     assert isinstance(h["borrow_date"], str) and len(h["borrow_date"]) == 10
     assert h["borrow_date"].count("-") == 2
     assert (h["return_date"] is None) or (isinstance(h["return_date"], str) and len(h["return_date"]) == 10)
+
+
+def test_patron_status_report_refreshes_after_borrow(seeded_books):
+    """R7: a cached report is not reused once the patron borrows another book."""
+    patron = "123459"
+    b = seeded_books["1010101010101"]
+
+    before = get_patron_status_report(patron)
+    assert before["borrowed_count"] == 0
+    before["current_loans"].append({"book_id": -1})  # callers get a copy, not the cached report
+    assert get_patron_status_report(patron)["current_loans"] == []
+
+    borrow_date = datetime.now()
+    assert database.insert_borrow_record(patron, b["id"], borrow_date, borrow_date + timedelta(days=14))
+
+    after = get_patron_status_report(patron)
+    assert after["borrowed_count"] == 1
+
+
+def test_patron_status_report_sees_commits_from_other_connections(run_on_file_database):
+    """R7: a cached report is not reused after another connection commits a loan."""
+    def scenario(path):
+        database.bulk_insert_books([("Shared File Book", "Tester", "8888888888888", 1)])
+        book = database.get_book_by_isbn("8888888888888")
+        assert get_patron_status_report("123460")["borrowed_count"] == 0
+
+        #another writer (e.g. a second worker process) records a loan
+        other = sqlite3.connect(path)
+        with other:
+            other.execute(
+                "INSERT INTO borrow_records (patron_id, book_id, borrow_date, due_date) VALUES (?, ?, ?, ?)",
+                ("123460", book["id"], datetime.now().isoformat(), (datetime.now() + timedelta(days=14)).isoformat()),
+            )
+        other.close()
+
+        return get_patron_status_report("123460")["borrowed_count"]
+
+    assert run_on_file_database(scenario) == 1
@@ -1,319 +1,308 @@
 import pytest
-from unittest.mock import Mock
 from services.payment_service import PaymentGateway
 import services.library_service as library_service
 
+
+@pytest.fixture(scope="module")
+def _shared_gateway():
+    """One real PaymentGateway per module."""
+    return PaymentGateway()
+
+
+@pytest.fixture
+def gateway(_shared_gateway):
+    """The shared PaymentGateway, with its recorded transactions cleared after each test."""
+    yield _shared_gateway
+    _shared_gateway._txns.clear()
+
+
 # test for successful payment
-def test_process_payment_success():
-    """Test a successful payment using mock gateway."""
-    mock_gateway = Mock(spec=PaymentGateway)
-    mock_gateway.process_payment.return_value = (True, "txn_123", "Success")
+def test_process_payment_success(stub_gateway):
+    """Test a successful payment using the gateway stub."""
+    stub_gateway.process_payment.return_value = (True, "txn_123", "Success")
 
-    success, txn_id, message = mock_gateway.process_payment("123456", 10.0, "Late fees")
+    success, txn_id, message = stub_gateway.process_payment("123456", 10.0, "Late fees")
 
-    mock_gateway.process_payment.assert_called_once_with("123456", 10.0, "Late fees")
+    stub_gateway.process_payment.assert_called_once_with("123456", 10.0, "Late fees")
     assert success is True
     assert txn_id == "txn_123"
     assert "success" in message.lower()
 
 
 # test for declined payment
-def test_process_payment_declined():
+def test_process_payment_declined(stub_gateway):
     """Test payment declined by gateway."""
-    mock_gateway = Mock(spec=PaymentGateway)
-    mock_gateway.process_payment.return_value = (False, None, "Declined")
+    stub_gateway.process_payment.return_value = (False, None, "Declined")
 
-    success, txn_id, message = mock_gateway.process_payment("123456", 10.0, "Late fees")
+    success, txn_id, message = stub_gateway.process_payment("123456", 10.0, "Late fees")
 
-    mock_gateway.process_payment.assert_called_once_with("123456", 10.0, "Late fees")
+    stub_gateway.process_payment.assert_called_once_with("123456", 10.0, "Late fees")
     assert success is False
     assert txn_id is None
     assert "declined" in message.lower()
 
 
 # test for invalid patron id
-def test_process_payment_invalid_patron_id():
-    """Test payment mock not called when patron id is invalid."""
-    mock_gateway = Mock(spec=PaymentGateway)
-
+def test_process_payment_invalid_patron_id(stub_gateway):
+    """Test payment stub not called when patron id is invalid."""
     # simulate invalid patron before gateway call
     patron_id = "12"  # not 6 digits
     if len(patron_id) != 6:
         success, txn_id, message = False, None, "Invalid patron ID"
 
-    mock_gateway.process_payment.assert_not_called()
+    stub_gateway.process_payment.assert_not_called()
     assert success is False
     assert "invalid patron" in message.lower()
 
 
 # test for zero amount
-def test_process_payment_zero_amount():
-    """Test gateway mock not called when amount is zero."""
-    mock_gateway = Mock(spec=PaymentGateway)
-
+def test_process_payment_zero_amount(stub_gateway):
+    """Test gateway stub not called when amount is zero."""
     amount = 0
     if amount <= 0:
         success, txn_id, message = False, None, "Invalid amount"
 
-    mock_gateway.process_payment.assert_not_called()
+    stub_gateway.process_payment.assert_not_called()
     assert success is False
     assert "invalid amount" in message.lower()
 
 
 # test for successful refund
-def test_refund_payment_success():
+def test_refund_payment_success(stub_gateway):
     """Test refund processed successfully."""
-    mock_gateway = Mock(spec=PaymentGateway)
-    mock_gateway.refund_payment.return_value = (True, "Refund success")
+    stub_gateway.refund_payment.return_value = (True, "Refund success")
 
-    success, message = mock_gateway.refund_payment("txn_001", 10.0)
+    success, message = stub_gateway.refund_payment("txn_001", 10.0)
 
-    mock_gateway.refund_payment.assert_called_once_with("txn_001", 10.0)
+    stub_gateway.refund_payment.assert_called_once_with("txn_001", 10.0)
     assert success is True
     assert "refund" in message.lower()
 
 
 # test for invalid transaction id
-def test_refund_payment_invalid_transaction():
-    """Test refund mock not called for invalid transaction id."""
-    mock_gateway = Mock(spec=PaymentGateway)
-
+def test_refund_payment_invalid_transaction(stub_gateway):
+    """Test refund stub not called for invalid transaction id."""
     txn_id = "abc"
     if not txn_id.startswith("txn_"):
         success, message = False, "Invalid transaction ID"
 
-    mock_gateway.refund_payment.assert_not_called()
+    stub_gateway.refund_payment.assert_not_called()
     assert success is False
     assert "invalid transaction" in message.lower()
 
 
 # test for invalid refund amounts
 @pytest.mark.parametrize("amount", [-1, 0, 20])
-def test_refund_payment_invalid_amount(amount):
-    """Test refund mock not called for invalid amounts."""
-    mock_gateway = Mock(spec=PaymentGateway)
-
+def test_refund_payment_invalid_amount(amount, stub_gateway):
+    """Test refund stub not called for invalid amounts."""
     if amount <= 0 or amount > 15:
         success, message = False, "Invalid refund amount"
 
-    mock_gateway.refund_payment.assert_not_called()
+    stub_gateway.refund_payment.assert_not_called()
     assert success is False
     assert "invalid refund amount" in message.lower()
 
 # test for book not found
-def test_pay_late_fees_book_not_found(mocker):
+def test_pay_late_fees_book_not_found(mocker, stub_gateway):
     """Test when book cannot be found in database."""
     mocker.patch("services.library_service.calculate_late_fee_for_book", return_value={"fee_amount": 5.00})
     mocker.patch("services.library_service.database.get_book_by_id", return_value=None)
 
-    mock_gateway = Mock(spec=PaymentGateway)
-
-    success, message, transaction_id = library_service.pay_late_fees("123456", 1, mock_gateway)
+    success, message, transaction_id = library_service.pay_late_fees("123456", 1, stub_gateway)
 
-    mock_gateway.process_payment.assert_not_called()
+    stub_gateway.process_payment.assert_not_called()
     assert success is False
     assert "book not found" in message.lower()
     assert transaction_id is None
 
 
 # test for payment processing error
-def test_pay_late_fees_gateway_exception(mocker):
+def test_pay_late_fees_gateway_exception(mocker, stub_gateway):
     """Test network or API error during payment."""
     mocker.patch("services.library_service.calculate_late_fee_for_book", return_value={"fee_amount": 5.00})
     mocker.patch("services.library_service.database.get_book_by_id", return_value={"title": "Test Book"})
 
-    mock_gateway = Mock(spec=PaymentGateway)
-    mock_gateway.process_payment.side_effect = Exception("Network timeout")
+    stub_gateway.process_payment.side_effect = Exception("Network timeout")
 
-    success, message, transaction_id = library_service.pay_late_fees("123456", 1, mock_gateway)
+    success, message, transaction_id = library_service.pay_late_fees("123456", 1, stub_gateway)
 
-    mock_gateway.process_payment.assert_called_once()
+    stub_gateway.process_payment.assert_called_once()
     assert success is False
     assert "network timeout" in message.lower()
     assert transaction_id is None
 
 
 # test for missing fee_amount key
-def test_pay_late_fees_missing_fee_key(mocker):
+def test_pay_late_fees_missing_fee_key(mocker, stub_gateway):
     """Test when calculate_late_fee_for_book returns dict missing 'fee_amount' key."""
     mocker.patch("services.library_service.calculate_late_fee_for_book", return_value={"wrong_key": 5})
     mocker.patch("services.library_service.database.get_book_by_id", return_value={"title": "Test Book"})
 
-    mock_gateway = Mock(spec=PaymentGateway)
+    success, message, transaction_id = library_service.pay_late_fees("123456", 1, stub_gateway)
 
-    success, message, transaction_id = library_service.pay_late_fees("123456", 1, mock_gateway)
-
-    mock_gateway.process_payment.assert_not_called()
+    stub_gateway.process_payment.assert_not_called()
     assert success is False
     assert "unable to calculate" in message.lower()
 
 
 # test for refund amount exceeds maximum
-def test_refund_late_fee_amount_exceeds_limit():
+def test_refund_late_fee_amount_exceeds_limit(stub_gateway):
     """Test refund fails when amount exceeds $15 limit."""
-    mock_gateway = Mock(spec=PaymentGateway)
-
-    success, message = library_service.refund_late_fee_payment("txn_111", 20.0, mock_gateway)
+    success, message = library_service.refund_late_fee_payment("txn_111", 20.0, stub_gateway)
 
-    mock_gateway.refund_payment.assert_not_called()
+    stub_gateway.refund_payment.assert_not_called()
     assert success is False
     assert "exceeds" in message.lower()
 
 
-# test for refund payment failure
-def test_refund_late_fee_gateway_failure():
-    """Test refund fails when gateway returns failure."""
-    mock_gateway = Mock(spec=PaymentGateway)
-    mock_gateway.refund_payment.return_value = (False, "Refund failed")
-
-    success, message = library_service.refund_late_fee_payment("txn_111", 5.0, mock_gateway)
-
-    mock_gateway.refund_payment.assert_called_once_with("txn_111", 5.0)
-    assert success is False
-    assert "refund failed" in message.lower()
-
-
-# test for refund gateway exception
-def test_refund_late_fee_gateway_exception():
-    """Test refund fails when gateway raises an exception."""
-    mock_gateway = Mock(spec=PaymentGateway)
-    mock_gateway.refund_payment.side_effect = Exception("Gateway unavailable")
+# test for refund failures reported or raised by the gateway
+@pytest.mark.parametrize("txn_id, amount, outcome, expected", [
+    ("txn_111", 5.0, (False, "Refund failed"), "refund failed"),
+    ("txn_111", 5.0, Exception("Gateway unavailable"), "gateway unavailable"),
+    ("txn_333", 10.0, Exception("System error"), "system error"),
+])
+def test_refund_late_fee_gateway_error(stub_gateway, txn_id, amount, outcome, expected):
+    """Test refund fails when the gateway returns failure or raises."""
+    if isinstance(outcome, Exception):
+        stub_gateway.refund_payment.side_effect = outcome
+    else:
+        stub_gateway.refund_payment.return_value = outcome
 
-    success, message = library_service.refund_late_fee_payment("txn_111", 5.0, mock_gateway)
+    success, message = library_service.refund_late_fee_payment(txn_id, amount, stub_gateway)
 
-    mock_gateway.refund_payment.assert_called_once()
+    stub_gateway.refund_payment.assert_called_once_with(txn_id, amount)
     assert success is False
-    assert "gateway unavailable" in message.lower()
+    assert expected in message.lower()
 
 
 # test for invalid patron id format (non-digit)
-def test_pay_late_fees_invalid_patron_non_digit(mocker):
+def test_pay_late_fees_invalid_patron_non_digit(mocker, stub_gateway):
     """Test when patron ID contains letters instead of digits."""
     mocker.patch("services.library_service.calculate_late_fee_for_book", return_value={"fee_amount": 5.00})
     mocker.patch("services.library_service.database.get_book_by_id", return_value={"title": "Sample"})
 
-    mock_gateway = Mock(spec=PaymentGateway)
-    success, message, txn_id = library_service.pay_late_fees("abc123", 1, mock_gateway)
+    success, message, txn_id = library_service.pay_late_fees("abc123", 1, stub_gateway)
 
-    mock_gateway.process_payment.assert_not_called()
+    stub_gateway.process_payment.assert_not_called()
     assert success is False
     assert "invalid patron id" in message.lower()
 
 
-# test for late fee exactly zero
-def test_pay_late_fees_exact_zero_fee(mocker):
-    """Test when fee_amount is exactly zero."""
-    mocker.patch("services.library_service.calculate_late_fee_for_book", return_value={"fee_amount": 0.0})
-    mocker.patch("services.library_service.database.get_book_by_id", return_value={"title": "Zero Book"})
-
-    mock_gateway = Mock(spec=PaymentGateway)
-    success, message, txn_id = library_service.pay_late_fees("123456", 1, mock_gateway)
-
-    mock_gateway.process_payment.assert_not_called()
-    assert success is False
-    assert "no late fees" in message.lower()
-
-
-# test for negative fee (edge condition)
-def test_pay_late_fees_negative_fee(mocker):
-    """Test when fee_amount is negative (invalid edge case)."""
-    mocker.patch("services.library_service.calculate_late_fee_for_book", return_value={"fee_amount": -2.00})
-    mocker.patch("services.library_service.database.get_book_by_id", return_value={"title": "Bad Fee Book"})
+# test for zero or negative late fee (no payment due)
+@pytest.mark.parametrize("fee, title", [(0.0, "Zero Book"), (-2.00, "Bad Fee Book")])
+def test_pay_late_fees_no_fee_due(mocker, stub_gateway, fee, title):
+    """Test gateway not called when fee_amount is zero or negative."""
+    mocker.patch("services.library_service.calculate_late_fee_for_book", return_value={"fee_amount": fee})
+    mocker.patch("services.library_service.database.get_book_by_id", return_value={"title": title})
 
-    mock_gateway = Mock(spec=PaymentGateway)
-    success, message, txn_id = library_service.pay_late_fees("123456", 1, mock_gateway)
+    success, message, txn_id = library_service.pay_late_fees("123456", 1, stub_gateway)
 
-    mock_gateway.process_payment.assert_not_called()
+    stub_gateway.process_payment.assert_not_called()
     assert success is False
     assert "no late fees" in message.lower()
 
 
 # test for refund success followed by double-call prevention
-def test_refund_late_fee_double_call():
+def test_refund_late_fee_double_call(stub_gateway):
     """Test refund called once and not twice."""
-    mock_gateway = Mock(spec=PaymentGateway)
-    mock_gateway.refund_payment.return_value = (True, "Refund processed")
+    stub_gateway.refund_payment.return_value = (True, "Refund processed")
 
-    success, message = library_service.refund_late_fee_payment("txn_222", 5.0, mock_gateway)
-    mock_gateway.refund_payment.assert_called_once_with("txn_222", 5.0)
+    success, message = library_service.refund_late_fee_payment("txn_222", 5.0, stub_gateway)
+    stub_gateway.refund_payment.assert_called_once_with("txn_222", 5.0)
     assert success is True
     assert "refund processed" in message.lower()
 
     # Ensure no duplicate refund was triggered
-    mock_gateway.refund_payment.assert_called_once()
-
-
-# test for refund with exception and large amount
-def test_refund_late_fee_exception_large_amount():
-    """Test exception raised during refund of large amount."""
-    mock_gateway = Mock(spec=PaymentGateway)
-    mock_gateway.refund_payment.side_effect = Exception("System error")
-
-    success, message = library_service.refund_late_fee_payment("txn_333", 10.0, mock_gateway)
-
-    mock_gateway.refund_payment.assert_called_once()
-    assert success is False
-    assert "system error" in message.lower()
+    stub_gateway.refund_payment.assert_called_once()
 
 
 # test for PaymentGateway invalid amount
-def test_gateway_process_payment_invalid_amount():
+def test_gateway_process_payment_invalid_amount(gateway):
     """Test direct PaymentGateway method with invalid amount."""
-    gateway = PaymentGateway()
     success, txn, msg = gateway.process_payment("123456", -1, "Invalid Payment")
     assert success is False
     assert "invalid amount" in msg.lower()
 
 
 # test for PaymentGateway payment over limit
-def test_gateway_process_payment_over_limit():
+def test_gateway_process_payment_over_limit(gateway):
     """Test direct PaymentGateway with amount exceeding limit."""
-    gateway = PaymentGateway()
     success, txn, msg = gateway.process_payment("123456", 1500.0, "Over Limit Payment")
     assert success is False
     assert "exceeds limit" in msg.lower()
 
 
 # test for PaymentGateway invalid patron ID
-def test_gateway_process_payment_invalid_id():
+def test_gateway_process_payment_invalid_id(gateway):
     """Test invalid patron ID length."""
-    gateway = PaymentGateway()
     success, txn, msg = gateway.process_payment("123", 20.0, "Short ID")
     assert success is False
     assert "invalid patron id" in msg.lower()
 
 
 # test for PaymentGateway successful refund flow
-def test_gateway_refund_payment_success():
+def test_gateway_refund_payment_success(gateway):
     """Test full successful refund process through real PaymentGateway logic."""
-    gateway = PaymentGateway()
     success, message = gateway.refund_payment("txn_999", 5.0)
     assert success is True
     assert "refund of $5.00" in message.lower()
 
 
 # test for PaymentGateway invalid transaction refund
-def test_gateway_refund_payment_invalid_transaction():
+def test_gateway_refund_payment_invalid_transaction(gateway):
     """Test refund fails with invalid transaction id."""
-    gateway = PaymentGateway()
     success, message = gateway.refund_payment("bad_id", 5.0)
     assert success is False
     assert "invalid transaction id" in message.lower()
 
 
 # test for PaymentGateway verify_payment_status success
-def test_gateway_verify_payment_status_success():
-    """Test verify_payment_status returns completed for valid transaction."""
-    gateway = PaymentGateway()
-    result = gateway.verify_payment_status("txn_777")
+def test_gateway_verify_payment_status_success(gateway):
+    """Test verify_payment_status returns completed for a processed transaction."""
+    success, txn, _ = gateway.process_payment("123456", 5.00, "Late fees")
+    assert success is True
+
+    result = gateway.verify_payment_status(txn)
     assert result["status"] == "completed"
-    assert "txn_777" in result["transaction_id"]
+    assert result["transaction_id"] == txn
 
 
 # test for PaymentGateway verify_payment_status not found
-def test_gateway_verify_payment_status_not_found():
+def test_gateway_verify_payment_status_not_found(gateway):
     """Test verify_payment_status returns not_found for invalid transaction."""
-    gateway = PaymentGateway()
     result = gateway.verify_payment_status("invalid")
     assert result["status"] == "not_found"
-    assert "transaction not found" in result["message"].lower()
\ No newline at end of file
+    assert "transaction not found" in result["message"].lower()
+
+    #well-formed but never processed by this gateway
+    assert gateway.verify_payment_status("txn_777")["status"] == "not_found"
+
+
+# test for PaymentGateway verify_payment_status of a processed payment
+def test_gateway_verify_payment_status_recorded_payment(gateway):
+    """Test verify_payment_status returns the record stored by process_payment."""
+    success, txn, _ = gateway.process_payment("123456", 7.25, "Late fees")
+    assert success is True
+
+    result = gateway.verify_payment_status(txn)
+    assert result["transaction_id"] == txn
+    assert result["status"] == "completed"
+    assert result["amount"] == 7.25
+
+    #the caller's copy is independent of the gateway's record
+    result["status"] = "refunded"
+    assert gateway.verify_payment_status(txn)["status"] == "completed"
+
+
+# test for PaymentGateway keeping separate records for payments in the same second
+def test_gateway_same_second_payments_recorded_separately(gateway):
+    """Test two payments by one patron in the same second get distinct IDs and records."""
+    ok_1, txn_1, _ = gateway.process_payment("123456", 3.00, "Fee A")
+    ok_2, txn_2, _ = gateway.process_payment("123456", 4.50, "Fee B")
+    assert ok_1 is True and ok_2 is True
+    assert txn_1 != txn_2  # the test clock is frozen, so both share one timestamp
+
+    first = gateway.verify_payment_status(txn_1)
+    second = gateway.verify_payment_status(txn_2)
+    assert (first["amount"], first["description"]) == (3.00, "Fee A")
+    assert (second["amount"], second["description"]) == (4.50, "Fee B")